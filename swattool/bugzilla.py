@@ -5,11 +5,12 @@
 import urllib
 import logging
 import json
+import pathlib
 from typing import Optional
 
 import requests
 
-from .webrequests import Session
+from .webrequests import get_session
 from . import utils
 
 logger = logging.getLogger(__name__)
@@ -18,7 +19,9 @@ BASE_URL = "https://bugzilla.yoctoproject.org"
 REST_BASE_URL = f"{BASE_URL}/rest/"
 ISSUE_URL = f"{BASE_URL}/show_bug.cgi?id="
 
-TOKENFILE = utils.DATADIR / 'bugzilla_token'
+
+def _get_token_file() -> pathlib.Path:
+    return utils.datadir() / 'bugzilla_token'
 
 
 class Bugzilla:
@@ -56,7 +59,7 @@ class Bugzilla:
             fparams = urllib.parse.urlencode(params, doseq=True)
             req = f"{REST_BASE_URL}bug?{fparams}"
             cache_timeout = 0 if force_refresh else cls.CACHE_TIMEOUT_S
-            data = Session().get(req, cache_timeout)
+            data = get_session().get_bytes(req, cache_timeout)
 
             cls.known_abints = {bug['id']: bug['summary']
                                 for bug in json.loads(data)['bugs']}
@@ -94,7 +97,7 @@ class Bugzilla:
 
         fparams = urllib.parse.urlencode(params, doseq=True)
         req = f"{REST_BASE_URL}bug?{fparams}"
-        data = Session().get(req, cls.CACHE_TIMEOUT_S)
+        data = get_session().get_bytes(req, cls.CACHE_TIMEOUT_S)
 
         jsondata = json.loads(data)['bugs']
         if len(jsondata) != 1:
@@ -105,7 +108,7 @@ class Bugzilla:
     @classmethod
     def login(cls, user: str, password: str) -> bool:
         """Login to bugzilla REST API."""
-        session = Session()
+        session = get_session()
 
         logger.info("Sending logging request...")
         params = {
@@ -117,7 +120,7 @@ class Bugzilla:
         req = f"{REST_BASE_URL}login?{fparams}"
 
         try:
-            data = session.get(req, 0)
+            data = session.get_bytes(req, 0)
         except requests.exceptions.HTTPError:
             logger.error("Login failed")
             return False
@@ -125,7 +128,7 @@ class Bugzilla:
         token = json.loads(data)['token']
         logger.info("Logging success")
 
-        with TOKENFILE.open('w') as file:
+        with _get_token_file().open('w') as file:
             file.write(token)
 
         return True
@@ -133,7 +136,7 @@ class Bugzilla:
     @classmethod
     def add_bug_comment(cls, bugid: int, comment: str):
         """Publish a new comment to a bugzilla issue."""
-        with TOKENFILE.open('r') as file:
+        with _get_token_file().open('r') as file:
             token = file.read()
 
         data = {
@@ -143,7 +146,7 @@ class Bugzilla:
 
         url = f"{REST_BASE_URL}bug/{bugid}/comment"
         try:
-            Session().post(url, data)
+            get_session().post(url, data)
         except requests.exceptions.HTTPError:
             logging.error("Failed to post comment on Bugzilla, please login")
             raise
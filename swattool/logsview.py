@@ -5,9 +5,7 @@
 import logging
 import re
 import shutil
-from typing import Optional
-
-from simple_term_menu import TerminalMenu  # type: ignore
+from typing import Iterable, Optional
 
 from . import swatbuild
 from . import utils
@@ -17,10 +15,11 @@ logger = logging.getLogger(__name__)
 
 class _Highlight:
     # pylint: disable=too-few-public-methods
-    def __init__(self, keyword: str, color: str, in_menu: bool):
+    def __init__(self, keyword: str, color: str, in_menu: bool, text: str):
         self.keyword = keyword
         self.color = color
         self.in_menu = in_menu
+        self.text = text
 
 
 class _Filter:
@@ -37,14 +36,20 @@ class _Filter:
         if not self.enabled:
             return (False, None)
 
-        match = self.pat.match(line)
+        match = self.pat.search(line)
         if not match:
             return (False, None)
 
         if not self.color:
             return (True, None)
 
-        hl = _Highlight(match.group("keyword"), self.color, self.in_menu)
+        # Highlight the last keyword of the line, as patterns starting with a
+        # greedy ".*" used to.
+        while nextmatch := self.pat.search(line, match.start() + 1):
+            match = nextmatch
+
+        hl = _Highlight(match.group("keyword"), self.color, self.in_menu,
+                        line)
         return (True, hl)
 
 
@@ -78,11 +83,11 @@ def _format_log_line(linenum: int, text: str, colorized_line: Optional[int],
             linecolor = highlight_lines[linenum].color
         else:
             linecolor = utils.Color.CYAN
-        text = utils.Color.colorize(text, linecolor)
+        text = utils.colorize(text, linecolor)
     elif linenum in highlight_lines:
         pat = highlight_lines[linenum].keyword
         color = highlight_lines[linenum].color
-        text = text.replace(pat, utils.Color.colorize(pat, color))
+        text = text.replace(pat, utils.colorize(pat, color))
     return text
 
 
@@ -159,37 +164,64 @@ def _format_log_preview(linenum: int, lines: list[str],
     return "\n".join(lines[:preview_height])
 
 
-def _get_log_highlights(loglines: list[str], failure: swatbuild.Failure
-                        ) -> dict[int, _Highlight]:
-    status = failure.build.status
-    test = failure.build.test
-    filters = [
+# All highlighting filters below need one of these words on the line: any
+# other line can be skipped with a single scan instead of trying every filter.
+_HIGHLIGHT_KEYWORDS = re.compile(r"error|warning|exception", flags=re.I)
+
+
+def _create_log_highlights_filters(toaster: bool, status: swatbuild.Status
+                                   ) -> list[_Filter]:
+    return [
         # Toaster specific rules:
         #  - Do nothing on "except xxxError:" (likely python code output).
         #  - Match on "selenium .*exception:".
-        _Filter(re.compile(r".*except\s*\S*error:", flags=re.I),
-                test == "toaster", None, False),
-        _Filter(re.compile(r"(.*\s|^)(?P<keyword>selenium\.\S*exception):",
+        _Filter(re.compile(r"except\s*\S*error:", flags=re.I),
+                toaster, None, False),
+        _Filter(re.compile(r"(?<!\S)(?P<keyword>selenium\.\S*exception):",
                            flags=re.I),
-                test == "toaster", utils.Color.RED,
+                toaster, utils.Color.RED,
                 status == swatbuild.Status.ERROR),
 
         # Generic rules:
         #  - Do nothing on "libgpg-error:"
         #  - Match on "error:", show in menu if build status is error.
         #  - Match on "warning:", show in menu if build status is warning.
-        _Filter(re.compile(r".*libgpg-error:"), True, None, False),
-        _Filter(re.compile(r"(.*\s|^)(?P<keyword>\S*error):", flags=re.I),
+        _Filter(re.compile(r"libgpg-error:"), True, None, False),
+        _Filter(re.compile(r"(?<!\S)(?P<keyword>\S*error):", flags=re.I),
                 True, utils.Color.RED, status == swatbuild.Status.ERROR),
-        _Filter(re.compile(r"(.*\s|^)(?P<keyword>\S*warning):",
+        _Filter(re.compile(r"(?<!\S)(?P<keyword>\S*warning):",
                            flags=re.I),
                 True, utils.Color.YELLOW, status == swatbuild.Status.WARNING),
-        _Filter(re.compile(r"(.*\s|^)(?P<keyword>make\[\d\]):.* Error"),
+        _Filter(re.compile(r"(?<!\S)(?P<keyword>make\[\d\]):.* Error"),
                 True, utils.Color.RED, status == swatbuild.Status.ERROR),
     ]
 
+
+_cached_log_highlights_filters: dict[tuple[bool, swatbuild.Status],
+                                     list[_Filter]] = {}
+
+
+def _get_log_highlights_filters(failure: swatbuild.Failure) -> list[_Filter]:
+    # Filters only depend on a few build properties: share them between all
+    # logs instead of creating them again for each one.
+    key = (failure.build.test == "toaster", failure.build.status)
+    filters = _cached_log_highlights_filters.get(key, None)
+    if filters is None:
+        filters = _create_log_highlights_filters(*key)
+        _cached_log_highlights_filters[key] = filters
+    return filters
+
+
+def _get_log_highlights(loglines: Iterable[str],
+                        failure: swatbuild.Failure
+                        ) -> dict[int, _Highlight]:
+    filters = _get_log_highlights_filters(failure)
+
     highlight_lines = {}
     for linenum, line in enumerate(loglines, start=1):
+        if not _HIGHLIGHT_KEYWORDS.search(line):
+            continue
+
         for filtr in filters:
             matched, highlight = filtr.match(line)
             if matched:
@@ -205,10 +237,10 @@ _cached_log_highlights: dict[tuple[swatbuild.Failure, str],
 
 
 def _get_cached_log_highlights(failure: swatbuild.Failure, logname: str,
-                               loglines: list[str]
+                               loglines: Iterable[str]
                                ) -> dict[int, _Highlight]:
     highlights = _cached_log_highlights.get((failure, logname), None)
-    if highlights:
+    if highlights is not None:
         return highlights
 
     highlights = _get_log_highlights(loglines, failure)
@@ -219,15 +251,18 @@ def _get_cached_log_highlights(failure: swatbuild.Failure, logname: str,
 def get_log_highlights(failure: swatbuild.Failure, logname: str
                        ) -> list[str]:
     """Get log highlights for a given log file."""
-    logdata = failure.get_log(logname)
-    if not logdata:
-        return []
-
-    loglines = logdata.splitlines()
+    # Highlights keep the text of their line: on cache hit, there is no need
+    # to load and split the whole log file again.
+    highlights = _cached_log_highlights.get((failure, logname), None)
+    if highlights is None:
+        logdata = failure.get_log(logname)
+        if not logdata:
+            return []
 
-    highlights = _get_cached_log_highlights(failure, logname, loglines)
+        highlights = _get_cached_log_highlights(failure, logname,
+                                                logdata.splitlines())
 
-    return [loglines[line - 1] for line in highlights
+    return [highlights[line].text for line in highlights
             if highlights[line].in_menu]
 
 
@@ -283,9 +318,9 @@ def show_log_menu(failure: swatbuild.Failure, logname: str) -> bool:
             f"{logname} of step {failure.stepnumber}"
     entry = 2
     while True:
-        menu = TerminalMenu(entries, title=title, cursor_index=entry,
-                            preview_command=preview, preview_size=preview_size,
-                            raise_error_on_interrupt=True)
+        menu = utils.create_menu(entries, title=title, cursor_index=entry,
+                                 preview_command=preview,
+                                 preview_size=preview_size)
         entry = menu.show()
         if entry is None:
             return True
@@ -3,13 +3,13 @@
 
 """A tool helping triage of Yocto autobuilder failures."""
 
+import concurrent.futures
 import logging
 import re
 import textwrap
 from typing import Any, Collection
 
 import click
-import tabulate
 
 from .bugzilla import Bugzilla
 from . import review
@@ -18,7 +18,7 @@ from . import swatbotrest
 from . import swatbuild
 from . import userdata
 from . import utils
-from .webrequests import Session
+from .webrequests import get_session
 
 logger = logging.getLogger(__name__)
 
@@ -200,7 +200,7 @@ def _format_pending_failures(builds: list[swatbuild.Build],
 def _show_failures(refresh: str, urlopens: set[str], limit: int,
                    sort: Collection[str], filters: dict[str, Any]):
     """Show all failures waiting for triage."""
-    swatbotrest.RefreshManager().set_policy_by_name(refresh)
+    swatbotrest.get_refresh_manager().set_policy_by_name(refresh)
 
     builds, userinfos = swatbot.get_failure_infos(limit=limit, sort=sort,
                                                   filters=filters)
@@ -228,6 +228,10 @@ def _show_failures(refresh: str, urlopens: set[str], limit: int,
     shown_fields = [f for f in shown_fields_all if f]
 
     table, headers = _format_pending_failures(builds, userinfos, shown_fields)
+    # Only import this module when needed, reducing startup time.
+    # pylint: disable=import-outside-toplevel
+    import tabulate
+
     print(tabulate.tabulate(table, headers=headers))
 
     logging.info("%s entries found (%s warnings, %s errors and %s cancelled)",
@@ -267,6 +271,30 @@ def show_pending_failures(refresh: str, limit: int, sort: list[str],
     _show_failures(refresh, urlopens, limit, sort, filters)
 
 
+def _download_log(build: swatbuild.Build):
+    logurl = build.get_first_failure().get_log_raw_url()
+    if logurl:
+        # Logs are only downloaded here, do not keep them in memory.
+        get_session().get_bytes(logurl, keep_in_memory=False)
+
+
+def _download_logs(builds: list[swatbuild.Build]):
+    logger.info("Downloading logs...")
+
+    # Downloads are network bound: run them in parallel.
+    executor = concurrent.futures.ThreadPoolExecutor(utils.get_jobs_count())
+    with executor:
+        jobs = [executor.submit(_download_log, build) for build in builds]
+        try:
+            with click.progressbar(length=len(jobs)) as jobsprogress:
+                for future in concurrent.futures.as_completed(jobs):
+                    future.result()
+                    jobsprogress.update(1)
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+
 @maingroup.command()
 @_add_options(failures_list_options)
 @_add_options(url_open_options)
@@ -276,7 +304,7 @@ def review_pending_failures(refresh: str,
     """Review failures waiting for triage."""
     # pylint: disable=too-many-arguments,too-many-positional-arguments
 
-    swatbotrest.RefreshManager().set_policy_by_name(refresh)
+    swatbotrest.get_refresh_manager().set_policy_by_name(refresh)
 
     urlopens = parse_urlopens(kwargs)
     filters = parse_filters(kwargs)
@@ -287,12 +315,7 @@ def review_pending_failures(refresh: str,
     if not builds:
         return
 
-    logger.info("Downloading logs...")
-    with click.progressbar(builds) as builds_progress:
-        for build in builds_progress:
-            logurl = build.get_first_failure().get_log_raw_url()
-            if logurl:
-                Session().get(logurl)
+    _download_logs(builds)
 
     # Make sure abints are up-to-date.
     Bugzilla.get_abints()
@@ -2,6 +2,7 @@
 
 """Swatbot review functions."""
 
+import functools
 import logging
 import shutil
 import sys
@@ -9,7 +10,6 @@ import textwrap
 from typing import Any, Optional
 
 import click
-from simple_term_menu import TerminalMenu  # type: ignore
 
 from . import logsview
 from . import swatbotrest
@@ -34,8 +34,8 @@ def _prompt_bug_infos(build: swatbuild.Build,
                 *[f"{k} {v}" for (k, v) in abints.items()],
             ]
 
-            abint_menu = TerminalMenu(abint_list, title="Bug", search_key=None,
-                                      raise_error_on_interrupt=True)
+            abint_menu = utils.create_menu(abint_list, title="Bug",
+                                           search_key=None)
             abint_index = abint_menu.show()
 
             if abint_index is None:
@@ -89,9 +89,9 @@ def _create_new_status(build: swatbuild.Build, command: str
         newstatus.comment = "Cancelled"
     elif command == "m":
         newstatus.status = swatbotrest.TriageStatus.MAIL_SENT
-    elif command == "i" and utils.MAILNAME:
+    elif command == "i" and utils.get_mailname():
         newstatus.status = swatbotrest.TriageStatus.MAIL_SENT
-        newstatus.comment = f"Mail sent by {utils.MAILNAME}"
+        newstatus.comment = f"Mail sent by {utils.get_mailname()}"
     elif command == "o":
         newstatus.status = swatbotrest.TriageStatus.OTHER
     elif command == "f":
@@ -212,33 +212,36 @@ def _handle_edit_command(build: swatbuild.Build, userinfo: userdata.UserInfo,
     return (False, False)
 
 
-_commands = [
-    "[a] ab-int",
-    "[b] bug opened",
-    "[c] cancelled no errors",
-    "[m] mail sent",
-    f"[i] mail sent by {utils.MAILNAME}" if utils.MAILNAME else "",
-    "[o] other",
-    "[f] other: Fixed",
-    "[d] other: Patch dropped",
-    "[t] not for swat",
-    "[r] reset status",
-    None,
-    "[e] edit notes",
-    "[u] open autobuilder URL",
-    "[w] open swatbot URL",
-    "[g] open stdio log of first failed step URL",
-    "[l] show stdio log of first failed step",
-    "[x] explore all logs",
-    None,
-    "[n] next",
-    "[p] previous",
-    "[s] select in failures list",
-    "[q] quit",
-]
-
-
-valid_commands = [c for c in _commands if c != ""]
+# Only built when the menu is first shown: getting the mail name may need to
+# run git.
+@functools.cache
+def _get_valid_commands() -> list[Optional[str]]:
+    mailname = utils.get_mailname()
+    commands = [
+        "[a] ab-int",
+        "[b] bug opened",
+        "[c] cancelled no errors",
+        "[m] mail sent",
+        (f"[i] mail sent by {mailname}" if mailname else ""),
+        "[o] other",
+        "[f] other: Fixed",
+        "[d] other: Patch dropped",
+        "[t] not for swat",
+        "[r] reset status",
+        None,
+        "[e] edit notes",
+        "[u] open autobuilder URL",
+        "[w] open swatbot URL",
+        "[g] open stdio log of first failed step URL",
+        "[l] show stdio log of first failed step",
+        "[x] explore all logs",
+        None,
+        "[n] next",
+        "[p] previous",
+        "[s] select in failures list",
+        "[q] quit",
+    ]
+    return [c for c in commands if c != ""]
 
 
 def review_menu(builds: list[swatbuild.Build],
@@ -249,12 +252,12 @@ def review_menu(builds: list[swatbuild.Build],
     need_refresh = False
 
     default_action = "n"
+    valid_commands = _get_valid_commands()
     default_index = [c[1] if c and len(c) > 1 else None
                      for c in valid_commands].index(default_action)
-    action_menu = TerminalMenu(valid_commands, title="Action",
-                               cursor_index=default_index,
-                               status_bar=statusbar,
-                               raise_error_on_interrupt=True)
+    action_menu = utils.create_menu(valid_commands, title="Action",
+                                    cursor_index=default_index,
+                                    status_bar=statusbar)
 
     build = builds[entry]
     userinfo = userinfos[build.id]
@@ -11,6 +11,7 @@ import click
 from . import swatbotrest
 from . import swatbuild
 from . import userdata
+from . import utils
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +39,8 @@ def _create_builds(filters: dict[str, Any],
 
     # Generate a list of all pending failures, fetching details from the remote
     # server as needed.
-    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+    executor = concurrent.futures.ThreadPoolExecutor(utils.get_jobs_count())
+    with executor:
         for buildid in limited_pending_ids:
             # Filter on status now, limiting the size of data we will have to
             # download from the server.
@@ -53,13 +55,19 @@ def _create_builds(filters: dict[str, Any],
                                         failures[buildid], userinfos[buildid]))
 
         try:
-            complete_iterator = concurrent.futures.as_completed(jobs)
-            with click.progressbar(complete_iterator,
-                                   length=len(jobs)) as jobsprogress:
-                for future in jobsprogress:
-                    build = future.result()
-                    if build is not None:
-                        infos.append(build)
+            # Handle all jobs completed since last wakeup at once, updating
+            # the progress bar once per batch.
+            pending = set(jobs)
+            with click.progressbar(length=len(jobs)) as jobsprogress:
+                while pending:
+                    done, pending = concurrent.futures.wait(
+                        pending,
+                        return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        build = future.result()
+                        if build is not None:
+                            infos.append(build)
+                    jobsprogress.update(len(done))
         except KeyboardInterrupt:
             executor.shutdown(cancel_futures=True)
             return ([], userinfos)
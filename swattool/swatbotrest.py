@@ -3,6 +3,7 @@
 """Interaction with the swatbot Django server."""
 
 import enum
+import functools
 import json
 import logging
 import urllib
@@ -11,7 +12,7 @@ from typing import Any, Optional
 import requests
 
 from . import utils
-from .webrequests import Session
+from .webrequests import get_session
 
 logger = logging.getLogger(__name__)
 
@@ -29,30 +30,21 @@ class RefreshPolicy(enum.Enum):
     AUTO = enum.auto()
 
 
+# Maximum cache age for policies not depending on the data type
+_MAX_AGE_BY_POLICY = {
+    RefreshPolicy.FORCE: 0,
+    RefreshPolicy.NO: -1,
+}
+
+
 class RefreshManager:
     """A refresh manager for the swatbot REST API."""
 
-    _instance = None
-
     AUTO_REFRESH_S = 60 * 60 * 24 * 30
 
-    # pylint: disable=duplicate-code
-    # pylint complains because of duplicate code in singleton init. We might do
-    # better, but keep it that way for now.
-    def __new__(cls, *args, **kwargs):
-        if not isinstance(cls._instance, cls):
-            cls._instance = super().__new__(cls, *args, **kwargs)
-            cls._instance.initialized = False
-        return cls._instance
-
     def __init__(self):
-        if self._instance.initialized:
-            return
-
         self.refresh_policy = RefreshPolicy.AUTO
 
-        self._instance.initialized = True
-
     def set_policy(self, policy: RefreshPolicy):
         """Set the global refresh policy."""
         self.refresh_policy = policy
@@ -71,12 +63,13 @@ class RefreshManager:
         if policy == RefreshPolicy.FORCE_FAILURES:
             policy = RefreshPolicy.FORCE if failures else RefreshPolicy.AUTO
 
-        if policy == RefreshPolicy.FORCE:
-            return 0
-        if policy == RefreshPolicy.NO:
-            return -1
+        return _MAX_AGE_BY_POLICY.get(policy, auto)
+
 
-        return auto
+@functools.cache
+def get_refresh_manager() -> RefreshManager:
+    """Get the shared refresh manager."""
+    return RefreshManager()
 
 
 class TriageStatus(enum.IntEnum):
@@ -99,12 +92,12 @@ class TriageStatus(enum.IntEnum):
 
 
 def _get_csrftoken() -> str:
-    return Session().session.cookies['csrftoken']
+    return get_session().session.cookies['csrftoken']
 
 
 def login(user: str, password: str) -> bool:
     """Login to the swatbot Django interface."""
-    session = Session()
+    session = get_session()
 
     logger.info("Sending logging request...")
     session.get(LOGIN_URL, 0)
@@ -131,12 +124,12 @@ def login(user: str, password: str) -> bool:
 
 
 def _get_json(path: str, max_cache_age: int = -1):
-    data = Session().get(f"{REST_BASE_URL}{path}", max_cache_age)
+    data = get_session().get_bytes(f"{REST_BASE_URL}{path}", max_cache_age)
     try:
         json_data = json.loads(data)
     except json.decoder.JSONDecodeError as err:
-        Session().invalidate_cache(f"{REST_BASE_URL}{path}")
-        if "Please login to see this page." in data:
+        get_session().invalidate_cache(f"{REST_BASE_URL}{path}")
+        if b"Please login to see this page." in data:
             raise utils.LoginRequiredException("Not logged in swatbot",
                                                "swatbot") from err
         raise utils.SwattoolException("Failed to parse server reply") from err
@@ -145,14 +138,14 @@ def _get_json(path: str, max_cache_age: int = -1):
 
 def get_build(buildid: int, refresh_override: Optional[RefreshPolicy] = None):
     """Get info on a given build."""
-    maxage = RefreshManager().get_refresh_max_age(refresh_override)
+    maxage = get_refresh_manager().get_refresh_max_age(refresh_override)
     return _get_json(f"/build/{buildid}/", maxage)['data']
 
 
 def get_build_collection(collectionid: int, refresh_override:
                          Optional[RefreshPolicy] = None):
     """Get info on a given build collection."""
-    maxage = RefreshManager().get_refresh_max_age(refresh_override)
+    maxage = get_refresh_manager().get_refresh_max_age(refresh_override)
     return _get_json(f"/buildcollection/{collectionid}/", maxage)['data']
 
 
@@ -162,7 +155,8 @@ def invalidate_stepfailures_cache():
     This can be used to force fetching failures on next build, when we suspect
     it might have changed remotely.
     """
-    Session().invalidate_cache(f"{REST_BASE_URL}/stepfailure/", allparams=True)
+    get_session().invalidate_cache(f"{REST_BASE_URL}/stepfailure/",
+                                   allparams=True)
 
 
 FAILURES_AUTO_REFRESH_S = 60 * 60 * 4
@@ -180,9 +174,9 @@ def get_stepfailures(status: Optional[TriageStatus] = None,
             auto_refresh_s = PENDING_FAILURES_AUTO_REFRESH_S
 
     request = f"/stepfailure/?{urllib.parse.urlencode(params)}"
-    maxage = RefreshManager().get_refresh_max_age(refresh_override,
-                                                  failures=True,
-                                                  auto=auto_refresh_s)
+    maxage = get_refresh_manager().get_refresh_max_age(refresh_override,
+                                                       failures=True,
+                                                       auto=auto_refresh_s)
 
     return _get_json(request, maxage)['data']
 
@@ -190,7 +184,7 @@ def get_stepfailures(status: Optional[TriageStatus] = None,
 def get_stepfailure(failureid: int,
                     refresh_override: Optional[RefreshPolicy] = None):
     """Get info on a given failure."""
-    maxage = RefreshManager().get_refresh_max_age(refresh_override)
+    maxage = get_refresh_manager().get_refresh_max_age(refresh_override)
     return _get_json(f"/stepfailure/{failureid}/", maxage)['data']
 
 
@@ -221,4 +215,4 @@ def publish_status(failureid: int,
             "status": status.value,
             "notes": comment
             }
-    Session().post(swat_url, data)
+    get_session().post(swat_url, data)
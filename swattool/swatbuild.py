@@ -10,13 +10,12 @@ from typing import Any, Iterable, Optional
 
 import click
 import requests
-import tabulate
 
 from . import bugzilla
 from . import swatbotrest
 from . import userdata
 from . import utils
-from .webrequests import Session
+from .webrequests import get_session
 
 logger = logging.getLogger(__name__)
 
@@ -47,7 +46,7 @@ class Status(enum.IntEnum):
             Status.CANCELLED: utils.Color.PURPLE,
             Status.UNKNOWN: utils.Color.CYAN,
         }
-        return utils.Color.colorize(text, colors[self])
+        return utils.colorize(text, colors[self])
 
     def as_colored_str(self):
         """Return status in a pretty colorized string."""
@@ -113,7 +112,7 @@ class Failure:
         logging.debug("Log info URL: %s", info_url)
 
         try:
-            info_data = Session().get(info_url)
+            info_data = get_session().get_bytes(info_url)
         except requests.exceptions.HTTPError:
             return None
 
@@ -133,7 +132,7 @@ class Failure:
             return None
 
         try:
-            logdata = Session().get(logurl)
+            logdata = get_session().get(logurl)
         except requests.exceptions.ConnectionError:
             logger.warning("Failed to download stdio log")
             return None
@@ -237,8 +236,9 @@ class Build:
         if not logdata:
             return False
 
-        for pat in filters['log-matches']:
-            for line in logdata.splitlines():
+        # Split the log only once, whatever the number of patterns.
+        for line in logdata.splitlines():
+            for pat in filters['log-matches']:
                 if pat.match(line):
                     return True
 
@@ -328,8 +328,7 @@ class Build:
             if field == Field.BRANCH:
                 _, _, branchname = self.branch.rpartition('/')
                 if branchname not in ["master", "master-next"]:
-                    return utils.Color.colorize(self.branch,
-                                                utils.Color.YELLOW)
+                    return utils.colorize(self.branch, utils.Color.YELLOW)
                 return self.branch
             return self.get(field)
 
@@ -355,6 +354,10 @@ class Build:
                           failure.stepname,
                           triage.format_description() if triage else ""])
 
+        # Only import this module when needed, reducing startup time.
+        # pylint: disable=import-outside-toplevel
+        import tabulate
+
         desc = tabulate.tabulate(table, tablefmt="plain")
 
         if userinfo.notes:
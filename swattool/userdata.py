@@ -3,28 +3,81 @@
 """Interaction with the swatbot Django server."""
 
 import collections
+import functools
 import logging
+import mmap
+import os
 import pathlib
+import pickle
+import re
 import shutil
 import textwrap
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper  # type: ignore
+
 from . import utils
 from . import swatbotrest
 from .bugzilla import Bugzilla
 
 logger = logging.getLogger(__name__)
 
-USERINFOFILE = utils.DATADIR / "userinfos.yaml"
+# Maximum number of journal entries, relative to the number of builds, before
+# writing the user infos file again.
+JOURNAL_MAX_RATIO = 0.1
+
+
+def _get_userinfos_file() -> pathlib.Path:
+    return utils.datadir() / "userinfos.yaml"
+
+
+def _get_pickle_file() -> pathlib.Path:
+    # Pickled copy of the user infos file content, much faster to load than
+    # YAML. The YAML file stays the reference: the pickle is only used when it
+    # was created from the current version of the YAML file.
+    return _get_userinfos_file().with_suffix('.pkl')
+
+
+def _get_journal_file() -> pathlib.Path:
+    # Latest changes, not written to the user infos file yet. This avoids
+    # writing all data when only a few builds were modified.
+    userinfosfile = _get_userinfos_file()
+    return userinfosfile.with_stem(f'{userinfosfile.stem}-journal')
+
+
+@functools.cache
+def _get_text_wrapper(width: int = 70, indent: str = ""
+                      ) -> textwrap.TextWrapper:
+    # Share wrappers instead of creating one for each wrapped line. Indent is
+    # not counted in the text width.
+    return textwrap.TextWrapper(width=width + len(indent),
+                                initial_indent=indent,
+                                subsequent_indent=indent)
+
+
+# Triage keys handled as attributes, others are kept in Triage.extra
+_TRIAGE_KNOWN_KEYS = frozenset(('failures', 'status', 'comment', 'extra'))
+
+# Cheaper than TriageStatus.from_str() for each loaded triage
+_TRIAGE_STATUS_BY_NAME = {status.name: status
+                          for status in swatbotrest.TriageStatus}
 
 
 class Triage:
-    """A failure new triage entry."""
+    """A failure new triage entry.
+
+    The as_dict() output is cached: attributes have to be assigned, not
+    modified in place, for this cache to be invalidated.
+    """
 
     def __init__(self, values: Optional[dict] = None):
-        self.failures: list[int] = []
+        self._dict_cache: Optional[dict] = None
+        self._failures: frozenset[int] = frozenset()
         self.status = swatbotrest.TriageStatus.PENDING
         self.comment = ""
         self.extra: dict[str, Any] = {}
@@ -32,10 +85,10 @@ class Triage:
         if values:
             try:
                 failures = values['failures']
-                status = swatbotrest.TriageStatus.from_str(values['status'])
+                status = _TRIAGE_STATUS_BY_NAME[values['status'].upper()]
                 comment = values['comment']
                 extra = {k: v for k, v in values.items()
-                         if k not in self.__dict__}
+                         if k not in _TRIAGE_KNOWN_KEYS}
             except KeyError:
                 pass
             else:
@@ -44,13 +97,32 @@ class Triage:
                 self.comment = comment
                 self.extra = extra
 
+    @property
+    def failures(self) -> frozenset[int]:
+        """Get the set of triaged failures ids."""
+        return self._failures
+
+    @failures.setter
+    def failures(self, failures: Iterable[int]):
+        self._failures = frozenset(failures)
+
+    def __setattr__(self, name: str, value: Any):
+        if name != '_dict_cache':
+            self._mark_dirty()
+        super().__setattr__(name, value)
+
+    def _mark_dirty(self):
+        self._dict_cache = None
+
     def as_dict(self) -> dict:
         """Export data as a dictionary."""
-        return {'failures': self.failures,
-                'status': self.status.name,
-                'comment': self.comment,
-                **self.extra
-                }
+        if self._dict_cache is None:
+            self._dict_cache = {'failures': sorted(self.failures),
+                                'status': self.status.name,
+                                'comment': self.comment,
+                                **self.extra
+                                }
+        return self._dict_cache
 
     def __str__(self):
         return f"{str(self.status)}: {self.comment}"
@@ -72,7 +144,8 @@ class Triage:
         if bzcomment:
             statusfrags.append("\n")
             bcomlines = bzcomment.split('\n')
-            bcom = [textwrap.fill(line) for line in bcomlines]
+            wrapper = _get_text_wrapper()
+            bcom = [wrapper.fill(line) for line in bcomlines]
             statusfrags.append("\n".join(bcom))
 
         return "".join(statusfrags)
@@ -82,6 +155,9 @@ class UserInfo:
     """A failure user data."""
 
     def __init__(self, values: Optional[dict] = None):
+        self._triages: list[Triage] = []
+        self._triages_by_failure: dict[int, Triage] = {}
+
         if values:
             self.notes = values.get('notes', [])
             self.triages = [Triage(t) for t in values.get('triages', [])]
@@ -89,15 +165,29 @@ class UserInfo:
             self.notes = []
             self.triages = []
 
+    @property
+    def triages(self) -> list[Triage]:
+        """Get the list of new triages."""
+        return self._triages
+
+    @triages.setter
+    def triages(self, triages: list[Triage]):
+        self._triages = triages
+        self._triages_by_failure = {}
+        for triage in triages:
+            for failureid in triage.failures:
+                self._triages_by_failure.setdefault(failureid, triage)
+
     def get_notes(self) -> str:
         """Get formatted user notes."""
         return "\n\n".join(self.notes)
 
     def get_wrapped_notes(self, width: int, indent: str):
         """Get formatted and wrapped user notes."""
-        wrapped_lns = ["\n".join([textwrap.indent(li, indent)
+        wrapper = _get_text_wrapper(width, indent)
+        wrapped_lns = ["\n".join([li
                                   for line in note.split("\n")
-                                  for li in textwrap.wrap(line, width)
+                                  for li in wrapper.wrap(line)
                                   ])
                        for note in self.notes]
         return "\n\n".join(wrapped_lns)
@@ -121,65 +211,220 @@ class UserInfo:
 
     def get_failure_triage(self, failureid: int) -> Optional[Triage]:
         """Get the Triage corresponding to a given failure id."""
-        for triage in self.triages:
-            if failureid in triage.failures:
-                return triage
+        triage = self._triages_by_failure.get(failureid, None)
+
+        # Failures might have been removed from the triage since it was
+        # indexed.
+        if triage is None or failureid not in triage.failures:
+            return None
+
+        return triage
+
+
+def _get_file_stamp(stat: os.stat_result) -> tuple[int, int, int]:
+    # Identify a version of a file. Restored files can have an older
+    # modification time, so only an exact match is meaningful.
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _load_pickled_userinfos(yamlstamp: tuple[int, int, int]
+                            ) -> Optional[dict]:
+    try:
+        with _get_pickle_file().open('rb') as file:
+            stamp, pretty_userinfos = pickle.load(file)
+    except (OSError, EOFError, ValueError, TypeError,
+            pickle.UnpicklingError):
+        return None
 
+    if stamp != yamlstamp:
         return None
 
+    return pretty_userinfos
+
+
+def _save_pickled_userinfos(pretty_userinfos: dict):
+    # Store the YAML file stamp along with data, the YAML file must be written
+    # first. Write atomically, so a truncated pickle file is never loaded.
+    yamlstamp = _get_file_stamp(_get_userinfos_file().stat())
+    picklefile = _get_pickle_file()
+    tmpfilename = picklefile.with_suffix('.pkl.tmp')
+    with tmpfilename.open('wb') as file:
+        pickle.dump((yamlstamp, pretty_userinfos), file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmpfilename, picklefile)
+
+
+def _get_next_backup_index(filename: pathlib.Path) -> int:
+    # Read the directory once rather than probing backup names one by one.
+    backup_re = re.compile(rf"{re.escape(filename.stem)}-backup-(\d+)"
+                           rf"{re.escape(filename.suffix)}")
+    with os.scandir(filename.parent) as entries:
+        indexes = [int(match.group(1)) for entry in entries
+                   if (match := backup_re.fullmatch(entry.name))]
+
+    return max(indexes, default=-1) + 1
+
+
+def _create_backup(filename: pathlib.Path, backupname: pathlib.Path):
+    # Saved files are always replaced, never modified, so a hard link is
+    # enough and avoids copying data.
+    try:
+        os.link(filename, backupname)
+    except OSError:
+        shutil.copy(filename, backupname)
+
+
+def _load_yaml(filename: pathlib.Path) -> dict:
+    with filename.open('rb') as file:
+        # Parse a memory mapping of the file, avoiding buffered reads copies.
+        # Empty files cannot be mapped.
+        if os.name == 'posix' and os.fstat(file.fileno()).st_size:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = yaml.load(mm, Loader=SafeLoader)
+        else:
+            data = yaml.load(file, Loader=SafeLoader)
+
+    # An empty file is loaded as None.
+    return data or {}
+
+
+def _save_yaml(filename: pathlib.Path, data: dict):
+    # Replace the file instead of rewriting it: backups might be hard links to
+    # the previous version.
+    tmpfilename = filename.with_suffix(f'{filename.suffix}.tmp')
+    with tmpfilename.open('w') as file:
+        yaml.dump(data, file, Dumper=SafeDumper)
+    os.replace(tmpfilename, filename)
+
+    # Create backup files. We might remove this once the code becomes more
+    # stable
+    i = _get_next_backup_index(filename)
+    _create_backup(filename, filename.with_stem(f'{filename.stem}-backup-{i}'))
+
 
 class UserInfos(collections.abc.MutableMapping):
     """A collection of failure user data."""
 
     def __init__(self):
-        self.infos = {}
+        self.infos: dict[int, UserInfo] = {}
+        # Loaded data not converted to UserInfo yet: this is only done when a
+        # given build is accessed.
+        self._raw_infos: dict[int, dict] = {}
+        # Last saved data of builds moved from _raw_infos to infos.
+        self._saved_infos: dict[int, dict] = {}
+        # Changes saved in the journal file, but not in the main file yet.
+        self._journal: dict[int, dict] = {}
         self.load()
 
     def load(self):
         """Load user infos stored during previous review session."""
         logger.info("Loading saved data...")
-        if USERINFOFILE.exists():
-            with USERINFOFILE.open('r') as file:
-                pretty_userinfos = yaml.load(file, Loader=yaml.Loader)
-                self.infos = pretty_userinfos
-                self.infos = {bid: UserInfo(info)
-                              for bid, info in pretty_userinfos.items()}
+        userinfosfile = _get_userinfos_file()
+        pretty_userinfos = {}
+        try:
+            yamlstamp = _get_file_stamp(userinfosfile.stat())
+        except FileNotFoundError:
+            yamlstamp = None
+        if yamlstamp:
+            pretty_userinfos = _load_pickled_userinfos(yamlstamp)
+            if pretty_userinfos is None:
+                pretty_userinfos = _load_yaml(userinfosfile)
+                _save_pickled_userinfos(pretty_userinfos)
+
+        journalfile = _get_journal_file()
+        journal = {}
+        if journalfile.exists():
+            journal = _load_yaml(journalfile)
+
+        self.infos = {}
+        self._saved_infos = {}
+        self._journal = journal
+        self._raw_infos = {bid: info
+                           for bid, info in {**pretty_userinfos,
+                                             **journal}.items()
+                           if info}
+
+    def _get_changes(self, pretty_userinfos: dict[int, dict]
+                     ) -> dict[int, dict]:
+        # Builds still in _raw_infos are unchanged: only look at the others.
+        # Removed builds are given an empty dict.
+        buildids = self._saved_infos.keys() | pretty_userinfos.keys()
+        return {bid: pretty_userinfos.get(bid, {}) for bid in buildids
+                if pretty_userinfos.get(bid, {})
+                != self._saved_infos.get(bid, {})}
 
     def save(self, suffix="") -> pathlib.Path:
         """Store user infos for later runs."""
+        userinfosfile = _get_userinfos_file()
+        journalfile = _get_journal_file()
+        savedfile = journalfile if self._journal else userinfosfile
+
+        # Builds never accessed since loading cannot have been modified.
+        if not suffix and not self.infos and not self._saved_infos:
+            return savedfile
+
         # Cleaning old reviews
         for info in self.infos.values():
             info.triages = [t for t in info.triages if t.failures]
 
-        pretty_userinfos = {bid: info.as_dict()
+        pretty_userinfos = {bid: data
                             for bid, info in self.infos.items()
-                            if info.as_dict()}
+                            if (data := info.as_dict())}
 
-        filename = USERINFOFILE.with_stem(f'{USERINFOFILE.stem}{suffix}')
-        with filename.open('w') as file:
-            yaml.dump(pretty_userinfos, file)
+        if suffix:
+            filename = userinfosfile.with_stem(f'{userinfosfile.stem}{suffix}')
+            _save_yaml(filename, {**self._raw_infos, **pretty_userinfos})
+            return filename
 
-        # Create backup files. We might remove this once the code becomes more
-        # stable
-        i = 0
-        while filename.with_stem(f'{filename.stem}-backup-{i}').exists():
-            i += 1
-        shutil.copy(filename,
-                    filename.with_stem(f'{filename.stem}-backup-{i}'))
+        changes = self._get_changes(pretty_userinfos)
+        if not changes:
+            return savedfile
 
-        return filename
+        # Only write changed builds to the journal file, as long as it stays
+        # small compared to the whole data.
+        self._journal.update(changes)
+        if len(self._journal) < JOURNAL_MAX_RATIO * len(self):
+            _save_yaml(journalfile, self._journal)
+            self._saved_infos = pretty_userinfos
+            return journalfile
+
+        all_userinfos = {**self._raw_infos, **pretty_userinfos}
+        _save_yaml(userinfosfile, all_userinfos)
+
+        # Written after the YAML file, so it gets its final stamp.
+        _save_pickled_userinfos(all_userinfos)
+
+        journalfile.unlink(missing_ok=True)
+        self._journal = {}
+        self._saved_infos = pretty_userinfos
+
+        return userinfosfile
 
     def __getitem__(self, buildid: int) -> UserInfo:
-        return self.infos.setdefault(buildid, UserInfo())
+        info = self.infos.get(buildid, None)
+        if info is None:
+            values = self._raw_infos.pop(buildid, None)
+            if values:
+                self._saved_infos[buildid] = values
+            info = UserInfo(values)
+            self.infos[buildid] = info
+        return info
 
     def __setitem__(self, buildid: int, value: UserInfo):
+        values = self._raw_infos.pop(buildid, None)
+        if values:
+            self._saved_infos[buildid] = values
         self.infos[buildid] = value
 
     def __delitem__(self, buildid: int):
-        del self.infos[buildid]
+        if buildid in self._raw_infos:
+            self._saved_infos[buildid] = self._raw_infos.pop(buildid)
+        else:
+            del self.infos[buildid]
 
     def __len__(self):
-        return len(self.infos)
+        return len(self.infos) + len(self._raw_infos)
 
     def __iter__(self):
-        return iter(self.infos)
+        # Iterate on a copy: accessing items moves them out of _raw_infos.
+        return iter([*self.infos, *self._raw_infos])
@@ -2,38 +2,140 @@
 
 """Various helpers with no better place to."""
 
+import functools
 import logging
 import os
 import pathlib
+import re
 import subprocess
 import sys
 import tempfile
-from typing import Any, Iterable, Optional
-
-from simple_term_menu import TerminalMenu  # type: ignore
+from typing import TYPE_CHECKING, Any, Iterable, Optional
 
 import click
-import tabulate
-import xdg  # type: ignore
 
-BINDIR = pathlib.Path(__file__).parent.parent.resolve()
-DATADIR = xdg.xdg_cache_home() / "swattool"
-CACHEDIR = DATADIR / "cache"
+if TYPE_CHECKING:
+    from simple_term_menu import TerminalMenu  # type: ignore
 
 logger = logging.getLogger(__name__)
 
 
-def _get_git_username() -> Optional[str]:
+@functools.cache
+def datadir() -> pathlib.Path:
+    """Get the directory where swattool data is stored."""
+    # Only look up directories when needed, reducing startup time.
+    # pylint: disable=import-outside-toplevel
+    import xdg  # type: ignore
+    return xdg.xdg_cache_home() / "swattool"
+
+
+@functools.cache
+def cachedir() -> pathlib.Path:
+    """Get the directory where swattool cache files are stored."""
+    return datadir() / "cache"
+
+
+@functools.cache
+def _get_git_config_files() -> list[pathlib.Path]:
+    # pylint: disable=import-outside-toplevel
+    import xdg  # type: ignore
+    return [pathlib.Path.home() / ".gitconfig",
+            xdg.xdg_config_home() / "git" / "config"]
+
+
+def run_capture(cmd: list[str], check: bool = False, text: bool = False,
+                **kwargs) -> subprocess.CompletedProcess:
+    """Run a command, capturing its output in temporary files."""
+    # Unlike pipes, temporary files cannot fill up and block the command, and
+    # avoid many small reads for large outputs.
+    with tempfile.TemporaryFile() as stdout, \
+            tempfile.TemporaryFile() as stderr:
+        process = subprocess.run(cmd, stdout=stdout, stderr=stderr,
+                                 check=False, **kwargs)
+        stdout.seek(0)
+        stderr.seek(0)
+        process.stdout = stdout.read()
+        process.stderr = stderr.read()
+
+    if text:
+        process.stdout = process.stdout.decode()
+        process.stderr = process.stderr.decode()
+    if check:
+        process.check_returncode()
+
+    return process
+
+
+def _load_git_config() -> dict[str, str]:
+    # Get all global settings at once, rather than running git for each one.
     try:
-        process = subprocess.run(["git", "config", "--global", "user.name"],
-                                 capture_output=True, check=True)
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return None
+        process = run_capture(["git", "config", "--global", "--list", "-z"],
+                              check=True, text=True, timeout=2)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired,
+            FileNotFoundError):
+        return {}
+
+    config = {}
+    for entry in process.stdout.split('\0'):
+        if entry:
+            key, _, value = entry.partition('\n')
+            config[key] = value
 
-    return process.stdout.decode().strip()
+    return config
 
 
-MAILNAME = _get_git_username()
+def _get_git_username() -> Optional[str]:
+    username = _load_git_config().get("user.name")
+    return username.strip() if username else None
+
+
+def _get_git_config_mtime() -> int:
+    mtimes = []
+    for path in _get_git_config_files():
+        try:
+            mtimes.append(path.stat().st_mtime_ns)
+        except OSError:
+            pass
+
+    return max(mtimes, default=0)
+
+
+@functools.cache
+def get_jobs_count() -> int:
+    """Get the number of parallel jobs to use for network bound tasks."""
+    # Jobs mostly wait for server replies: use more of them than CPUs.
+    default = min(32, (os.cpu_count() or 1) * 4)
+    jobs = os.environ.get("SWATTOOL_JOBS")
+    if not jobs:
+        return default
+
+    try:
+        return max(1, int(jobs))
+    except ValueError:
+        logger.warning("Invalid SWATTOOL_JOBS value: %s", jobs)
+        return default
+
+
+@functools.cache
+def get_mailname() -> Optional[str]:
+    """Get the user name to use in "mail sent by" comments."""
+    # Avoid spawning git on each run: reuse the last value, unless git
+    # configuration was modified since.
+    mailnamefile = datadir() / "mailname"
+    try:
+        if mailnamefile.stat().st_mtime_ns >= _get_git_config_mtime():
+            return mailnamefile.read_text() or None
+    except OSError:
+        pass
+
+    mailname = _get_git_username()
+    try:
+        mailnamefile.parent.mkdir(parents=True, exist_ok=True)
+        mailnamefile.write_text(mailname or "")
+    except OSError:
+        logger.warning("Failed to save git user name to %s", mailnamefile)
+
+    return mailname
 
 
 class Color:
@@ -50,10 +152,12 @@ class Color:
     CYAN = "\x1b[1;36m"
     WHITE = "\x1b[1;37m"
 
-    @classmethod
-    def colorize(cls, text: str, color: str) -> str:
-        """Colorize a string."""
-        return f"{color}{text}{cls.RESET}"
+
+def colorize(text: str, color: str) -> str:
+    """Colorize a string."""
+    if not color:
+        return text
+    return color + text + Color.RESET
 
 
 class SwattoolException(Exception):
@@ -79,42 +183,56 @@ class _LogFormatter(logging.Formatter):
     detail_logformat = "{color}[%(levelname)s] %(name)s: %(message)s{reset}"
     logformat = "{color}%(message)s{reset}"
 
-    def _format(self, record, color):
-        if color:
-            reset = Color.RESET
-        else:
-            color = reset = ""
+    def __init__(self, colored: bool):
+        super().__init__()
+
+        self.colored = colored
 
-        if record.levelno == logging.DEBUG:
-            log_fmt = self.detail_logformat.format(color=color, reset=reset)
+        # Create formatters of usual levels once, instead of for each record
+        self._formatters: dict[int, logging.Formatter] = {
+            levelno: self._create_formatter(levelno)
+            for levelno in (logging.DEBUG, logging.INFO, logging.WARNING,
+                            logging.ERROR, logging.CRITICAL)
+        }
+
+    def _create_formatter(self, levelno: int) -> logging.Formatter:
+        color = self.colors.get(levelno, "") if self.colored else ""
+        reset = Color.RESET if color else ""
+        if levelno == logging.DEBUG:
+            log_fmt = self.detail_logformat
         else:
-            log_fmt = self.logformat.format(color=color, reset=reset)
-        formatter = logging.Formatter(log_fmt)
+            log_fmt = self.logformat
+        return logging.Formatter(log_fmt.format(color=color, reset=reset))
+
+    def format(self, record):
+        formatter = self._formatters.get(record.levelno)
+        if formatter is None:
+            formatter = self._create_formatter(record.levelno)
+            self._formatters[record.levelno] = formatter
         return formatter.format(record)
 
 
-class _SimpleLogFormatter(_LogFormatter):
-    def format(self, record):
-        return self._format(record, None)
+_IS_TTY = sys.stdout.isatty()
 
+# Formatters hold no per handler state: share a single one
+_DEFAULT_FORMATTER = _LogFormatter(colored=_IS_TTY)
 
-class _PrettyLogFormatter(_LogFormatter):
-    def format(self, record):
-        return self._format(record, self.colors.get(record.levelno))
+# Whether debug logging is enabled, set by setup_logging()
+_DEBUG = False
 
 
 def setup_logging(verbose: int):
     """Create logging handlers ans setup logging configuration."""
-    if verbose >= 1:
+    global _DEBUG  # pylint: disable=global-statement
+
+    _DEBUG = verbose >= 1
+    if _DEBUG:
         loglevel = logging.DEBUG
     else:
         loglevel = logging.INFO
 
     defhandler = logging.StreamHandler()
-    if sys.stdout.isatty():
-        defhandler.setFormatter(_PrettyLogFormatter())
-    else:
-        defhandler.setFormatter(_SimpleLogFormatter())
+    defhandler.setFormatter(_DEFAULT_FORMATTER)
     handlers: list[logging.StreamHandler] = [defhandler]
 
     logging.basicConfig(level=loglevel, handlers=handlers)
@@ -122,18 +240,64 @@ def setup_logging(verbose: int):
 
 def clear():
     """Clear the screen."""
-    if logging.getLogger().level <= logging.DEBUG:
+    if _DEBUG:
         # Debug logging: never clear screen, to preserve traces
         return
 
     click.clear()
 
 
-def tabulated_menu(entries: Iterable[Iterable[Any]], **kwargs) -> TerminalMenu:
+def _is_number(value: Any) -> bool:
+    if isinstance(value, (int, float)):
+        return not isinstance(value, bool)
+    if isinstance(value, str):
+        try:
+            float(value)
+        except ValueError:
+            return False
+        return True
+    return False
+
+
+# Terminal color codes, not visible when computing text width
+_ANSI_ESCAPE_RE = re.compile(r"\x1b\[[0-9;]*m")
+
+
+def _plain_tabulate(entries: Iterable[Iterable[Any]]) -> list[str]:
+    # A lightweight replacement for tabulate with "plain" format, directly
+    # giving lines: numeric columns are right aligned, others left aligned.
+    # Cells may contain color codes, but are expected on a single line, as
+    # menu entries are.
+    rows = [["" if v is None else str(v).strip() for v in row]
+            for row in entries]
+    visible_rows = [[_ANSI_ESCAPE_RE.sub("", c) for c in row]
+                    for row in rows]
+    numeric = [all(_is_number(c) for c in col if c)
+               for col in zip(*visible_rows)]
+    widths = [max(len(c) for c in col) for col in zip(*visible_rows)]
+
+    def pad(cell: str, visible: str, width: int, num: bool) -> str:
+        padding = " " * (width - len(visible))
+        return padding + cell if num else cell + padding
+
+    return ["  ".join(pad(c, v, w, num) for c, v, w, num
+                      in zip(row, visible_row, widths, numeric)).rstrip()
+            for row, visible_row in zip(rows, visible_rows)]
+
+
+def create_menu(entries: list[Optional[str]], **kwargs) -> 'TerminalMenu':
+    """Generate a TerminalMenu raising an error on interrupt."""
+    # Only import this module when needed, reducing startup time.
+    # pylint: disable=import-outside-toplevel
+    from simple_term_menu import TerminalMenu  # type: ignore
+
+    return TerminalMenu(entries, raise_error_on_interrupt=True, **kwargs)
+
+
+def tabulated_menu(entries: Iterable[Iterable[Any]], **kwargs
+                   ) -> 'TerminalMenu':
     """Generate a TerminalMenu with tabulated lines."""
-    tabulated_entries = tabulate.tabulate(entries, tablefmt="plain")
-    return TerminalMenu(tabulated_entries.splitlines(),
-                        raise_error_on_interrupt=True, **kwargs)
+    return create_menu(_plain_tabulate(entries), **kwargs)
 
 
 def show_in_less(text: str, startline: Optional[int] = 0):
@@ -142,14 +306,24 @@ def show_in_less(text: str, startline: Optional[int] = 0):
     if startline:
         less_cmd.append(f"+G{startline}")
 
-    with tempfile.NamedTemporaryFile(mode='w', delete=False) as f:
-        f.write(text)
-        f.close()
-        try:
-            subprocess.run([*less_cmd, f.name], check=True)
-        except subprocess.CalledProcessError:
-            logger.error("Failed to start less")
-        os.unlink(f.name)
+    try:
+        if hasattr(os, 'memfd_create'):
+            # Give less an in-memory file: unlike a pipe, it can seek in it
+            # without having to buffer the text.
+            with os.fdopen(os.memfd_create("swattool-less"), 'w') as file:
+                file.write(text)
+                file.flush()
+                fd = file.fileno()
+                os.lseek(fd, 0, os.SEEK_SET)
+                subprocess.run([*less_cmd, f"/dev/fd/{fd}"], pass_fds=(fd,),
+                               check=True)
+        else:
+            # Give the text on less standard input rather than writing it to
+            # a temporary file.
+            subprocess.run([*less_cmd, "-"], input=text, text=True,
+                           check=True)
+    except subprocess.CalledProcessError:
+        logger.error("Failed to start less")
 
 
 def launch_in_system_defaultshow_in_less(text: str):
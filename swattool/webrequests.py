@@ -2,15 +2,23 @@
 
 """Wrapper for requests module with cookies persistence and basic cache."""
 
+import atexit
+import collections
+import concurrent.futures
+import contextlib
+import functools
 import gzip
 import hashlib
+import json
 import logging
+import os
 import pathlib
 import pickle
+import tempfile
 import time
 import threading
 import zlib
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 
 import requests
 
@@ -18,130 +26,402 @@ from . import utils
 
 logger = logging.getLogger(__name__)
 
-COOKIESFILE = utils.DATADIR / 'cookies'
+# Cache files locks, shared by URL hash so unrelated URLs rarely contend
+_CACHE_LOCKS_COUNT = 64
+_cache_locks = [threading.Lock() for _ in range(_CACHE_LOCKS_COUNT)]
 
-cache_lock = threading.Lock()
 
+def _get_cache_lock(url: str) -> threading.Lock:
+    return _cache_locks[hash(url) % _CACHE_LOCKS_COUNT]
 
-class Session:
-    """A session with persistent cookies."""
 
-    _instance = None
+# gzip reads and writes compressed data in small chunks: use larger buffers
+# for cache files, reducing the number of system calls.
+CACHE_BUFFER_SIZE = 128 * 1024
 
-    def __new__(cls, *args, **kwargs):
-        if not isinstance(cls._instance, cls):
-            cls._instance = super().__new__(cls, *args, **kwargs)
-            cls._instance.initialized = False
-        return cls._instance
+# Limits of the memory cache: only keep small data, such as REST replies,
+# and not logs.
+MEMORY_CACHE_SIZE = 256
+MEMORY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+MEMORY_CACHE_MAX_ENTRY_BYTES = 1024 * 1024
 
+
+class _MemoryCache:
+    # Recently used cache data, by URL, with the cache file modification time
     def __init__(self):
-        if self._instance.initialized:
-            return
+        self._entries: collections.OrderedDict[str, tuple[int, bytes]] = \
+            collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
 
-        self.session = requests.Session()
+    def get(self, url: str) -> Optional[tuple[int, bytes]]:
+        """Get modification time and data for an URL, if known."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry:
+                self._entries.move_to_end(url)
+            return entry
 
-        if COOKIESFILE.exists():
-            with COOKIESFILE.open('rb') as file:
-                self.session.cookies.update(pickle.load(file))
+    def set(self, url: str, mtime_ns: int, data: bytes):
+        """Set modification time and data for an URL, if not too large."""
+        with self._lock:
+            oldentry = self._entries.pop(url, None)
+            if oldentry:
+                self._size -= len(oldentry[1])
 
-        self._instance.initialized = True
+            if len(data) > MEMORY_CACHE_MAX_ENTRY_BYTES:
+                return
 
-    def save_cookies(self):
-        """Save cookies so they can be used for later sessions."""
-        COOKIESFILE.parent.mkdir(parents=True, exist_ok=True)
-        if self.session:
-            with COOKIESFILE.open('wb') as file:
-                pickle.dump(self.session.cookies, file)
+            self._entries[url] = (mtime_ns, data)
+            self._size += len(data)
+            while len(self._entries) > MEMORY_CACHE_SIZE or \
+                    self._size > MEMORY_CACHE_MAX_BYTES:
+                _, (_, olddata) = self._entries.popitem(last=False)
+                self._size -= len(olddata)
 
-    def invalidate_cache(self, url: str, allparams: bool = False):
-        """Invalidate cache for a given URL."""
-        with cache_lock:
-            if allparams:
-                prefix = self._get_cache_file_prefix(url)
-                for file in prefix.parent.glob(f"{prefix.name}*"):
-                    file.unlink()
-            else:
-                for file in self._get_cache_file_candidates(url):
-                    file.unlink(missing_ok=True)
 
-    def _get_cache_file_prefix(self, url: str) -> pathlib.Path:
-        filestem = url.split('://', 1)[1].replace('/', '_').replace(':', '_')
+_memory_cache = _MemoryCache()
+
+# Futures of URLs being fetched, protected by the cache locks
+_inflight_requests: dict[str, concurrent.futures.Future[bytes]] = {}
+
+# Directories already created by this process
+_created_dirs: set[pathlib.Path] = set()
+
+
+def _ensure_dir(path: pathlib.Path):
+    # Avoid a mkdir system call on each cache write.
+    if path not in _created_dirs:
+        path.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(path)
+
 
-        if len(filestem) > 100:
-            hashname = hashlib.sha256(filestem.encode(), usedforsecurity=False)
-            filestem = hashname.hexdigest()
+def _get_cookies_file() -> pathlib.Path:
+    return utils.datadir() / 'cookies.json'
 
-        return utils.CACHEDIR / filestem
 
-    def _get_cache_file_candidates(self, url: str) -> list[pathlib.Path]:
-        prefix = self._get_cache_file_prefix(url)
+def _get_old_cookies_file() -> pathlib.Path:
+    # Pickled cookie jar, saved by older versions
+    return utils.datadir() / 'cookies'
 
-        candidates = [
-            prefix.parent / f'{prefix.name}.gz',
-            prefix,
 
-            # For compatibility with old cache files
-            prefix.parent / f'{prefix.name}.json',
+# Characters of URLs not usable in cache file names
+_FILESTEM_TRANS = str.maketrans({'/': '_', ':': '_'})
+
+
+# Long file stems are replaced by a hash
+_MAX_FILESTEM_LEN = 100
+
+
+def _get_cache_filestem(url: str) -> str:
+    return url.split('://', 1)[1].translate(_FILESTEM_TRANS)
+
+
+# Cache file paths only depend on the URL: compute them once for each URL.
+@functools.lru_cache(maxsize=2048)
+def _get_cache_file_prefix(url: str) -> pathlib.Path:
+    filestem = _get_cache_filestem(url)
+
+    if len(filestem) > _MAX_FILESTEM_LEN:
+        # The hash is only used to shorten the name: use a fast one.
+        hashname = hashlib.blake2b(filestem.encode(), digest_size=16,
+                                   usedforsecurity=False)
+        filestem = hashname.hexdigest()
+
+    return utils.cachedir() / filestem
+
+
+@functools.lru_cache(maxsize=2048)
+def _get_cache_file_candidates(url: str) -> tuple[pathlib.Path, ...]:
+    prefix = _get_cache_file_prefix(url)
+
+    candidates = [
+        prefix.with_name(f'{prefix.name}.gz'),
+        prefix,
+
+        # For compatibility with old cache files
+        prefix.with_name(f'{prefix.name}.json'),
+    ]
+
+    filestem = _get_cache_filestem(url)
+    if len(filestem) > _MAX_FILESTEM_LEN:
+        # Long file stems were hashed with SHA-256 by older versions
+        hashname = hashlib.sha256(filestem.encode(), usedforsecurity=False)
+        oldprefix = utils.cachedir() / hashname.hexdigest()
+        candidates += [
+            oldprefix.with_name(f'{oldprefix.name}.gz'),
+            oldprefix,
+            oldprefix.with_name(f'{oldprefix.name}.json'),
         ]
 
-        return candidates
+    return tuple(candidates)
 
-    def _try_load_cache(self, cachefile: pathlib.Path, max_cache_age: int
-                        ) -> Optional[str]:
-        if max_cache_age < 0:
-            use_cache = True
+
+class Session:
+    """A session with persistent cookies."""
+
+    def __init__(self):
+        self._session = requests.Session()
+
+        # Allow one connection for each parallel job
+        adapter = requests.adapters.HTTPAdapter(
+            pool_maxsize=utils.get_jobs_count())
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+        # Only save cookies at exit if the server did set some
+        self._cookies_dirty = False
+        self._session.hooks['response'].append(self._check_cookies)
+        atexit.register(self._flush_cookies)
+
+        # Load cookies in background, the session is only made available
+        # once they are loaded.
+        self._cookies_loaded = threading.Event()
+        threading.Thread(target=self._load_cookies, daemon=True).start()
+
+    @property
+    def session(self) -> requests.Session:
+        """Get the underlying requests session, with cookies loaded."""
+        self._cookies_loaded.wait()
+        return self._session
+
+    def _load_cookies(self):
+        try:
+            cookiesfile = _get_cookies_file()
+            oldcookiesfile = _get_old_cookies_file()
+            if cookiesfile.exists():
+                with cookiesfile.open('r') as file:
+                    for cookie in json.load(file):
+                        self._session.cookies.set_cookie(
+                            requests.cookies.create_cookie(**cookie))
+            elif oldcookiesfile.exists():
+                with oldcookiesfile.open('rb') as file:
+                    self._session.cookies.update(pickle.load(file))
+        except (OSError, ValueError, TypeError, EOFError,
+                pickle.UnpicklingError) as error:
+            logger.warning("Failed to load saved cookies, you might need to "
+                           "login again: %s", error)
+            self._session.cookies.clear()
+        finally:
+            self._cookies_loaded.set()
+
+    def _check_cookies(self, response: requests.Response, *_args, **_kwargs):
+        if response.cookies:
+            self._cookies_dirty = True
+
+    def _flush_cookies(self):
+        if self._cookies_dirty:
+            self.save_cookies()
+
+    def save_cookies(self):
+        """Save cookies so they can be used for later sessions."""
+        cookiesfile = _get_cookies_file()
+        _ensure_dir(cookiesfile.parent)
+        if self.session:
+            cookies = [{'name': cookie.name,
+                        'value': cookie.value,
+                        'domain': cookie.domain,
+                        'path': cookie.path,
+                        'expires': cookie.expires,
+                        'secure': cookie.secure,
+                        } for cookie in self.session.cookies]
+            # Replace the file atomically, so cookies are never lost if
+            # interrupted while writing.
+            fd, tmpname = tempfile.mkstemp(dir=cookiesfile.parent,
+                                           prefix=f'.{cookiesfile.name}.')
+            try:
+                with open(fd, 'w', encoding='utf-8') as file:
+                    json.dump(cookies, file)
+                os.replace(tmpname, cookiesfile)
+            except BaseException:
+                os.unlink(tmpname)
+                raise
+            _get_old_cookies_file().unlink(missing_ok=True)
+            self._cookies_dirty = False
+
+    def invalidate_cache(self, url: str, allparams: bool = False):
+        """Invalidate cache for a given URL."""
+        if allparams:
+            # Files of any URL sharing the prefix can be removed: take all
+            # locks, always in the same order.
+            with contextlib.ExitStack() as stack:
+                for lock in _cache_locks:
+                    stack.enter_context(lock)
+
+                prefix = _get_cache_file_prefix(url)
+                try:
+                    with os.scandir(prefix.parent) as entries:
+                        for entry in entries:
+                            if entry.name.startswith(prefix.name):
+                                os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
         else:
-            age = time.time() - cachefile.stat().st_mtime
-            use_cache = age < max_cache_age
+            with _get_cache_lock(url):
+                for file in _get_cache_file_candidates(url):
+                    file.unlink(missing_ok=True)
+
+    def _try_load_memory_cache(self, url: str, cachefile: pathlib.Path,
+                               min_mtime_ns: int) -> Optional[bytes]:
+        entry = _memory_cache.get(url)
+        if not entry:
+            return None
+
+        # Only use data if the cache file was not replaced or removed since.
+        try:
+            stat = cachefile.stat()
+        except FileNotFoundError:
+            return None
+        if stat.st_mtime_ns != entry[0] or stat.st_mtime_ns <= min_mtime_ns:
+            return None
+
+        return entry[1]
+
+    def _try_load_cache(self, cachefile: pathlib.Path, min_mtime_ns: int
+                        ) -> Optional[tuple[bytes, int]]:
+        # Return cache data and cache file modification time, checking the
+        # age on the opened file so both match.
+        with cachefile.open('rb', buffering=CACHE_BUFFER_SIZE) as file:
+            stat = os.fstat(file.fileno())
+            if stat.st_mtime_ns <= min_mtime_ns:
+                return None
 
-        if use_cache:
             if cachefile.suffix == ".gz":
                 try:
-                    with gzip.open(cachefile, mode='r') as gzfile:
-                        return gzfile.read(-1).decode()
+                    with gzip.GzipFile(fileobj=file) as gzfile:
+                        return (gzfile.read(-1), stat.st_mtime_ns)
                 except zlib.error:
                     logging.warning("Failed to read %s cache file, ignoring",
                                     cachefile)
-            else:
-                with cachefile.open('r') as file:
-                    return file.read(-1)
-
-        return None
-
-    def _create_cache_file(self, cachefile: pathlib.Path, data: str):
-        if cachefile.suffix == ".gz":
-            with gzip.open(cachefile, mode='w') as gzfile:
-                gzfile.write(data.encode())
-        else:
-            with cachefile.open('w') as file:
-                file.write(data)
+                    return None
+
+            return (file.read(-1), stat.st_mtime_ns)
+
+    def _create_cache_file(self, cachefile: pathlib.Path,
+                           chunks: Iterable[bytes], url: str) -> int:
+        # Write a temporary file and move it in place, so cache files can be
+        # read without locking. The temporary file name starts with a dot, so
+        # it never matches a cache file prefix.
+        fd, tmpname = tempfile.mkstemp(dir=cachefile.parent,
+                                       prefix=f'.{cachefile.name}.')
+        try:
+            with open(fd, 'wb', buffering=CACHE_BUFFER_SIZE) as file:
+                if cachefile.suffix == ".gz":
+                    # Favor speed over size: cache files are written often,
+                    # and the default compression level is much slower for
+                    # little gain.
+                    with gzip.open(file, mode='wb',
+                                   compresslevel=1) as gzfile:
+                        for chunk in chunks:
+                            gzfile.write(chunk)
+                else:
+                    for chunk in chunks:
+                        file.write(chunk)
+
+            with _get_cache_lock(url):
+                # The new cache file is replaced, only remove the old ones.
+                for oldfile in _get_cache_file_candidates(url)[1:]:
+                    oldfile.unlink(missing_ok=True)
+                os.replace(tmpname, cachefile)
+                return os.stat(cachefile).st_mtime_ns
+        except BaseException:
+            os.unlink(tmpname)
+            raise
 
     def get(self, url: str, max_cache_age: int = -1) -> str:
         """Do a GET request."""
-        cache_candidates = self._get_cache_file_candidates(url)
+        return self.get_bytes(url, max_cache_age).decode(errors='replace')
+
+    def get_bytes(self, url: str, max_cache_age: int = -1,
+                  keep_in_memory: bool = True) -> bytes:
+        """Do a GET request, returning UTF-8 encoded data."""
+        cache_candidates = _get_cache_file_candidates(url)
         cache_new_file = cache_candidates[0]
-        cache_new_file.parent.mkdir(parents=True, exist_ok=True)
-
-        with cache_lock:
-            cache_olds = [file for file in cache_candidates if file.exists()]
-            for cachefile in cache_olds:
-                data = self._try_load_cache(cachefile, max_cache_age)
-                if data:
-                    logger.debug("Loaded cache file for %s: %s", url,
-                                 cachefile)
-                    return data
-
-        logger.debug("Fetching %s, cache file will be %s", url, cache_new_file)
-        req = self.session.get(url)
-        req.raise_for_status()
 
-        with cache_lock:
-            cache_olds = [file for file in cache_candidates if file.exists()]
-            for cachefile in cache_olds:
-                cachefile.unlink()
-            self._create_cache_file(cache_new_file, req.text)
+        # Cache files modified before this time are too old. Compute it once,
+        # using integer nanoseconds as stat() does.
+        if max_cache_age < 0:
+            min_mtime_ns = -1
+        else:
+            min_mtime_ns = time.time_ns() - max_cache_age * 1_000_000_000
+
+        data = self._try_load_memory_cache(url, cache_new_file, min_mtime_ns)
+        if data:
+            logger.debug("Using memory cache for %s", url)
+            return data
+
+        # No locking needed: cache files are replaced atomically.
+        for cachefile in cache_candidates:
+            # Just try to load each file rather than checking existence
+            # first: this is one less system call for each candidate.
+            try:
+                loaded = self._try_load_cache(cachefile, min_mtime_ns)
+            except FileNotFoundError:
+                continue
+            if loaded and loaded[0]:
+                logger.debug("Loaded cache file for %s: %s", url, cachefile)
+                if keep_in_memory and cachefile == cache_new_file:
+                    _memory_cache.set(url, loaded[1], loaded[0])
+                return loaded[0]
+
+        return self._fetch_once(url, cache_new_file, keep_in_memory)
+
+    def _fetch_once(self, url: str, cachefile: pathlib.Path,
+                    keep_in_memory: bool) -> bytes:
+        # Only fetch data once if several threads request the same URL.
+        with _get_cache_lock(url):
+            future = _inflight_requests.get(url)
+            fetching = future is None
+            if fetching:
+                future = concurrent.futures.Future()
+                _inflight_requests[url] = future
+
+        if not fetching:
+            logger.debug("Waiting for pending fetch of %s", url)
+            return future.result()
+
+        logger.debug("Fetching %s, cache file will be %s", url, cachefile)
+        try:
+            data, mtime_ns = self._fetch(url, cachefile)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(data)
+            if keep_in_memory:
+                _memory_cache.set(url, mtime_ns, data)
+        finally:
+            with _get_cache_lock(url):
+                del _inflight_requests[url]
+
+        return data
+
+    def _fetch(self, url: str, cachefile: pathlib.Path
+               ) -> tuple[bytes, int]:
+        # Return fetched data and the modification time of its cache file
+        _ensure_dir(cachefile.parent)
+        with self.session.get(url, stream=True) as req:
+            req.raise_for_status()
+
+            if req.encoding and req.encoding.lower() not in ('utf-8', 'utf8'):
+                # Cache files are always UTF-8 encoded
+                data = req.text.encode()
+                mtime_ns = self._create_cache_file(cachefile, (data,), url)
+            else:
+                # Write data to the cache file while it is received, keeping
+                # a copy to be returned.
+                buffer = bytearray()
+
+                def tee_chunks():
+                    for chunk in req.iter_content(CACHE_BUFFER_SIZE):
+                        buffer.extend(chunk)
+                        yield chunk
 
-        return req.text
+                mtime_ns = self._create_cache_file(cachefile, tee_chunks(),
+                                                   url)
+                data = bytes(buffer)
+
+        return (data, mtime_ns)
 
     def post(self, url: str, data: dict[str, Any]) -> str:
         """Do a POST request."""
@@ -150,3 +430,9 @@ class Session:
 
         req.raise_for_status()
         return req.text
+
+
+@functools.cache
+def get_session() -> Session:
+    """Get the shared session."""
+    return Session()